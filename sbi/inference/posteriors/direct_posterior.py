@@ -1,5 +1,6 @@
 # This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
 # under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
+from math import prod
 from typing import Optional, Union
 
 import torch
@@ -100,7 +101,7 @@ class DirectPosterior(NeuralPosterior):
             show_progress_bars: Whether to show sampling progress monitor.
         """
 
-        num_samples = torch.Size(sample_shape).numel()
+        num_samples = prod(sample_shape)
         condition_shape = self.posterior_estimator._condition_shape
         x = self._x_else_default_x(x)
 
@@ -1,6 +1,7 @@
 # This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
 # under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
 
+from math import prod
 from typing import List, Optional, Tuple, Union
 
 import torch
@@ -165,7 +166,7 @@ class EnsemblePosterior(NeuralPosterior):
         Returns:
             Samples drawn from the ensemble distribution.
         """
-        num_samples = torch.Size(sample_shape).numel()
+        num_samples = prod(sample_shape)
         posterior_indizes = torch.multinomial(
             self._weights, num_samples, replacement=True
         )
@@ -1,5 +1,6 @@
 # This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
 # under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
+from math import prod
 from typing import Any, Callable, Optional, Tuple, Union
 
 import torch
@@ -201,7 +202,7 @@ class ImportanceSamplingPosterior(NeuralPosterior):
         Returns:
             Samples and logarithm of corresponding importance weights.
         """
-        num_samples = torch.Size(sample_shape).numel()
+        num_samples = prod(sample_shape)
         samples, log_importance_weights = importance_sample(
             self.potential_fn,
             proposal=self.proposal,
@@ -248,7 +249,7 @@ class ImportanceSamplingPosterior(NeuralPosterior):
             else max_sampling_batch_size
         )
 
-        num_samples = torch.Size(sample_shape).numel()
+        num_samples = prod(sample_shape)
         samples = sampling_importance_resampling(
             self.potential_fn,
             proposal=self.proposal,
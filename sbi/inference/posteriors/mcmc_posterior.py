@@ -1,8 +1,8 @@
 # This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
 # under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
 from functools import partial
-from math import ceil
-from typing import Any, Callable, Dict, Optional, Union
+from math import ceil, prod, sqrt
+from typing import Any, Callable, Dict, Optional, Tuple, Union
 from warnings import warn
 
 import arviz as az
@@ -30,7 +30,13 @@ from sbi.samplers.mcmc import (
 )
 from sbi.simulators.simutils import tqdm_joblib
 from sbi.types import Shape, TorchTransform
-from sbi.utils import pyro_potential_wrapper, tensor2numpy, transformed_potential
+from sbi.utils import (
+    check_warn_and_setstate,
+    numpy_potential_wrapper,
+    pyro_potential_wrapper,
+    tensor2numpy,
+    transformed_potential,
+)
 from sbi.utils.torchutils import ensure_theta_batched
 
 
@@ -55,6 +61,11 @@ class MCMCPosterior(NeuralPosterior):
         num_workers: int = 1,
         device: Optional[str] = None,
         x_shape: Optional[torch.Size] = None,
+        step_size_adaptation: str = "dual_averaging",
+        warm_start: bool = False,
+        adapt_width: bool = False,
+        shrink_batch_size: int = 1,
+        use_threads: bool = False,
     ):
         """
         Args:
@@ -92,6 +103,26 @@ class MCMCPosterior(NeuralPosterior):
                 `potential_fn.device` is used.
             x_shape: Shape of a single simulator output. If passed, it is used to check
                 the shape of the observed data and give a descriptive error.
+            step_size_adaptation: How the step size of `hmc` and `nuts` is adapted,
+                either `dual_averaging` (Pyro's default, during warmup) or `bisection`.
+                `bisection` runs short batches of all chains with a fixed step size and
+                bisects the step size until the mean acceptance rate across chains hits
+                the target; the step size is then frozen for warmup and sampling.
+            warm_start: Whether `sample()` continues the chains of the previous call
+                if it used the same `x` and number of chains. The warmup is then
+                skipped for `slice_np` and `slice_np_vectorized`. For the Pyro
+                samplers (`slice`, `hmc` and `nuts`), the warmup is still run because
+                it tunes the slice width or the step size and mass matrix.
+            adapt_width: Only used for `slice_np` and `slice_np_vectorized`. If
+                `True`, the bracket widths are tuned to a weighted mean of the step
+                sizes during tuning instead of to the mean of the final bracket widths.
+            shrink_batch_size: Only used for `slice_np`. Number of points that are
+                drawn from the bracket at once and evaluated in a single batch while
+                shrinking it.
+            use_threads: Only used for `slice_np` with `num_workers>1`. If `True`,
+                the chains are run in threads instead of processes. This avoids
+                pickling the potential and starting processes, and the chains run in
+                parallel while PyTorch evaluates the potential.
         """
 
         super().__init__(
@@ -109,9 +140,17 @@ class MCMCPosterior(NeuralPosterior):
         self.init_strategy = init_strategy
         self.init_strategy_parameters = init_strategy_parameters or {}
         self.num_workers = num_workers
+        self.step_size_adaptation = step_size_adaptation
+        self.warm_start = warm_start
+        self.adapt_width = adapt_width
+        self.shrink_batch_size = shrink_batch_size
+        self.use_threads = use_threads
         self._posterior_sampler = None
+        self._mcmc_init_x = None
+        self._warned_log_prob = False
         # Hardcode parameter name to reduce clutter kwargs.
         self.param_name = "theta"
+        _check_step_size_adaptation(step_size_adaptation)
 
         if init_strategy_num_candidates is not None:
             warn(
@@ -172,13 +211,16 @@ class MCMCPosterior(NeuralPosterior):
         Returns:
             `len($\theta$)`-shaped log-probability.
         """
-        warn(
-            """`.log_prob()` is deprecated for methods that can only evaluate the
-            log-probability up to a normalizing constant. Use `.potential()`
-            instead.""",
-            stacklevel=2,
-        )
-        warn("The log-probability is unnormalized!", stacklevel=2)
+        # Only warn on the first call, `.log_prob()` is often called in a loop.
+        if not self._warned_log_prob:
+            warn(
+                """`.log_prob()` is deprecated for methods that can only evaluate the
+                log-probability up to a normalizing constant. Use `.potential()`
+                instead.""",
+                stacklevel=2,
+            )
+            warn("The log-probability is unnormalized!", stacklevel=2)
+            self._warned_log_prob = True
 
         self.potential_fn.set_x(self._x_else_default_x(x))
 
@@ -203,6 +245,11 @@ class MCMCPosterior(NeuralPosterior):
         sample_with: Optional[str] = None,
         num_workers: Optional[int] = None,
         show_progress_bars: bool = True,
+        step_size_adaptation: Optional[str] = None,
+        warm_start: Optional[bool] = None,
+        adapt_width: Optional[bool] = None,
+        shrink_batch_size: Optional[int] = None,
+        use_threads: Optional[bool] = None,
     ) -> Tensor:
         r"""Return samples from posterior distribution $p(\theta|x)$ with MCMC.
 
@@ -233,6 +280,18 @@ class MCMCPosterior(NeuralPosterior):
         num_chains = self.num_chains if num_chains is None else num_chains
         init_strategy = self.init_strategy if init_strategy is None else init_strategy
         num_workers = self.num_workers if num_workers is None else num_workers
+        step_size_adaptation = (
+            self.step_size_adaptation
+            if step_size_adaptation is None
+            else step_size_adaptation
+        )
+        _check_step_size_adaptation(step_size_adaptation)
+        warm_start = self.warm_start if warm_start is None else warm_start
+        adapt_width = self.adapt_width if adapt_width is None else adapt_width
+        shrink_batch_size = (
+            self.shrink_batch_size if shrink_batch_size is None else shrink_batch_size
+        )
+        use_threads = self.use_threads if use_threads is None else use_threads
         init_strategy_parameters = (
             self.init_strategy_parameters
             if init_strategy_parameters is None
@@ -278,16 +337,43 @@ class MCMCPosterior(NeuralPosterior):
         warmup_steps = _maybe_use_dict_entry(warmup_steps, "warmup_steps", m_p)
         num_chains = _maybe_use_dict_entry(num_chains, "num_chains", m_p)
         init_strategy = _maybe_use_dict_entry(init_strategy, "init_strategy", m_p)
-        self.potential_ = self._prepare_potential(method)  # type: ignore
-
-        initial_params = self._get_initial_params(
-            init_strategy,  # type: ignore
-            num_chains,  # type: ignore
-            num_workers,
-            show_progress_bars,
-            **init_strategy_parameters,
+        warm_start = _maybe_use_dict_entry(warm_start, "warm_start", m_p)
+        adapt_width = _maybe_use_dict_entry(adapt_width, "adapt_width", m_p)
+        shrink_batch_size = _maybe_use_dict_entry(
+            shrink_batch_size, "shrink_batch_size", m_p
         )
-        num_samples = torch.Size(sample_shape).numel()
+
+        if warm_start and self._can_warm_start(num_chains):  # type: ignore
+            # The chains of the previous call have already converged for this `x`.
+            initial_params = self._mcmc_init_params
+            # Pyro kernels only tune their parameters during warmup, so keep it.
+            if method in ("slice_np", "slice_np_vectorized"):
+                warmup_steps = 0
+        else:
+            initial_params = self._get_initial_params(
+                init_strategy,  # type: ignore
+                num_chains,  # type: ignore
+                num_workers,
+                show_progress_bars,
+                **init_strategy_parameters,
+            )
+        num_samples = prod(sample_shape)
+
+        # The numpy slice samplers evaluate the potential on batches of fixed size
+        # (one parameter set for `slice_np`, one per chain for `slice_np_vectorized`).
+        # They are copied into a single buffer that is allocated once per call.
+        # Batches of another size, e.g. `shrink_batch_size` candidates, are converted
+        # as usual. Chains that run in threads can not share a buffer.
+        theta_buffer = None
+        threaded = method == "slice_np" and use_threads and num_workers > 1
+        if method in ("slice_np", "slice_np_vectorized") and not threaded:
+            batch_size = num_chains if method == "slice_np_vectorized" else 1
+            theta_buffer = torch.empty(
+                (batch_size, initial_params.shape[1]),  # type: ignore
+                dtype=torch.float32,
+                device=self._device,
+            )
+        self.potential_ = self._prepare_potential(method, theta_buffer)  # type: ignore
 
         track_gradients = method in ("hmc", "nuts")
         with torch.set_grad_enabled(track_gradients):
@@ -301,6 +387,9 @@ class MCMCPosterior(NeuralPosterior):
                     vectorized=(method == "slice_np_vectorized"),
                     num_workers=num_workers,
                     show_progress_bars=show_progress_bars,
+                    adapt_width=adapt_width,  # type: ignore
+                    shrink_batch_size=shrink_batch_size,  # type: ignore
+                    use_threads=use_threads,
                 )
             elif method in ("hmc", "nuts", "slice"):
                 transformed_samples = self._pyro_mcmc(
@@ -311,15 +400,35 @@ class MCMCPosterior(NeuralPosterior):
                     thin=thin,  # type: ignore
                     warmup_steps=warmup_steps,  # type: ignore
                     num_chains=num_chains,
+                    num_workers=num_workers,
                     show_progress_bars=show_progress_bars,
+                    step_size_adaptation=step_size_adaptation,
                 )
             else:
                 raise NameError
+        # Remember on which `x` the chains ended in `self._mcmc_init_params`. Copy it,
+        # such that in-place changes of the user's `x` are detected.
+        x_o = self.potential_fn.return_x_o()
+        self._mcmc_init_x = None if x_o is None else x_o.clone()
 
         samples = self.theta_transform.inv(transformed_samples)
 
         return samples.reshape((*sample_shape, -1))  # type: ignore
 
+    def _can_warm_start(self, num_chains: int) -> bool:
+        """Return whether the chains of the previous `sample()` call can be continued.
+
+        This requires that they were run for the same `x` and number of chains.
+        """
+        x_o = self.potential_fn.return_x_o()
+        return (
+            self._mcmc_init_x is not None
+            and x_o is not None
+            and self._mcmc_init_params.shape[0] == num_chains
+            and x_o.shape == self._mcmc_init_x.shape
+            and torch.equal(x_o, self._mcmc_init_x)
+        )
+
     def _build_mcmc_init_fn(
         self,
         proposal: Any,
@@ -445,6 +554,9 @@ class MCMCPosterior(NeuralPosterior):
         num_workers: int = 1,
         init_width: Union[float, ndarray] = 0.01,
         show_progress_bars: bool = True,
+        adapt_width: bool = False,
+        shrink_batch_size: int = 1,
+        use_threads: bool = False,
     ) -> Tensor:
         """Custom implementation of slice sampling using Numpy.
 
@@ -459,6 +571,11 @@ class MCMCPosterior(NeuralPosterior):
             init_width: Inital width of brackets.
             show_progress_bars: Whether to show a progressbar during sampling;
                 can only be turned off for vectorized sampler.
+            adapt_width: Whether to tune the bracket widths to the step sizes.
+            shrink_batch_size: Number of points evaluated at once while shrinking the
+                bracket, only used if not `vectorized`.
+            use_threads: Whether to run chains in threads instead of processes if
+                `num_workers>1`, only used if not `vectorized`.
 
         Returns:
             Tensor of shape (num_samples, shape_of_single_theta).
@@ -467,9 +584,13 @@ class MCMCPosterior(NeuralPosterior):
         num_chains, dim_samples = initial_params.shape
 
         if not vectorized:
-            SliceSamplerMultiChain = SliceSamplerSerial
+            SliceSamplerMultiChain = partial(
+                SliceSamplerSerial,
+                shrink_batch_size=shrink_batch_size,
+                use_threads=use_threads,
+            )
         else:
-            SliceSamplerMultiChain = SliceSamplerVectorized
+            SliceSamplerMultiChain = SliceSamplerVectorized  # type: ignore
 
         posterior_sampler = SliceSamplerMultiChain(
             init_params=tensor2numpy(initial_params),
@@ -479,6 +600,7 @@ class MCMCPosterior(NeuralPosterior):
             verbose=show_progress_bars,
             num_workers=num_workers,
             init_width=init_width,
+            adapt_width=adapt_width,
         )
         warmup_ = warmup_steps * thin
         num_samples_ = ceil((num_samples * thin) / num_chains)
@@ -508,10 +630,16 @@ class MCMCPosterior(NeuralPosterior):
         thin: int = 10,
         warmup_steps: int = 200,
         num_chains: Optional[int] = 1,
+        num_workers: int = 1,
         show_progress_bars: bool = True,
+        step_size_adaptation: str = "dual_averaging",
     ) -> Tensor:
         r"""Return samples obtained using Pyro HMC, NUTS for slice kernels.
 
+        If `num_workers > 1`, the chains are run in parallel processes by Pyro.
+        Otherwise, they are run one after the other in the current process, which
+        avoids the overhead of spawning a process per chain.
+
         Args:
             num_samples: Desired number of samples.
             potential_function: A callable **class**. A class, but not a function,
@@ -521,7 +649,11 @@ class MCMCPosterior(NeuralPosterior):
             thin: Thinning (subsampling) factor.
             warmup_steps: Initial number of samples to discard.
             num_chains: Whether to sample in parallel. If None, use all but one CPU.
+            num_workers: Number of CPU cores to use. If larger than one, chains are
+                run in parallel processes.
             show_progress_bars: Whether to show a progressbar during sampling.
+            step_size_adaptation: Either `dual_averaging` or `bisection`, only used for
+                `hmc` and `nuts`.
 
         Returns:
             Tensor of shape (num_samples, shape_of_single_theta).
@@ -529,36 +661,154 @@ class MCMCPosterior(NeuralPosterior):
         num_chains = mp.cpu_count() - 1 if num_chains is None else num_chains
 
         kernels = dict(slice=Slice, hmc=HMC, nuts=NUTS)
+        num_samples_per_chain = (thin * num_samples) // num_chains + num_chains
+
+        kernel_kwargs = {}
+        if step_size_adaptation == "bisection" and mcmc_method in ("hmc", "nuts"):
+            step_size, initial_params = self._bisect_step_size(
+                kernel=kernels[mcmc_method],
+                potential_function=potential_function,
+                initial_params=initial_params,
+                target_accept_prob=0.7 if mcmc_method == "hmc" else 0.8,
+            )
+            kernel_kwargs = dict(
+                step_size=step_size, adapt_step_size=False, adapt_mass_matrix=False
+            )
 
-        sampler = MCMC(
-            kernel=kernels[mcmc_method](potential_fn=potential_function),
-            num_samples=(thin * num_samples) // num_chains + num_chains,
-            warmup_steps=warmup_steps,
-            initial_params={self.param_name: initial_params},
-            num_chains=num_chains,
-            mp_context="spawn",
-            disable_progbar=not show_progress_bars,
-            transforms={},
-        )
-        sampler.run()
-        samples = next(iter(sampler.get_samples().values())).reshape(
+        def build_sampler(initial_params: Tensor) -> MCMC:
+            return MCMC(
+                kernel=kernels[mcmc_method](
+                    potential_fn=potential_function, **kernel_kwargs
+                ),
+                num_samples=num_samples_per_chain,
+                warmup_steps=warmup_steps,
+                initial_params={self.param_name: initial_params},
+                num_chains=initial_params.shape[0],
+                mp_context="spawn",
+                disable_progbar=not show_progress_bars,
+                transforms={},
+            )
+
+        if num_chains > 1 and num_workers > 1:
+            samplers = [build_sampler(initial_params)]
+        else:
+            samplers = [
+                build_sampler(initial_params[c : c + 1]) for c in range(num_chains)
+            ]
+
+        for sampler in samplers:
+            sampler.run()
+        samples = torch.cat([
+            next(iter(sampler.get_samples().values())) for sampler in samplers
+        ]).reshape(
             -1,
             initial_params.shape[1],  # .shape[1] = dim of theta
         )
 
-        # Save posterior sampler.
-        self._posterior_sampler = sampler
+        # Save posterior sampler. Chains that were run one after the other each
+        # have their own sampler, all of which are kept for the diagnostics.
+        self._posterior_sampler = samplers[-1]
+        self._pyro_samplers = samplers
+
+        # Save sample as potential next init (if init_strategy == 'latest_sample').
+        last_params = [
+            sampler.get_samples(group_by_chain=True)[self.param_name][:, -1]
+            for sampler in samplers
+        ]
+        self._mcmc_init_params = torch.cat(last_params).reshape(num_chains, -1)
 
         samples = samples[::thin][:num_samples]
         assert samples.shape[0] == num_samples
 
         return samples.detach()
 
-    def _prepare_potential(self, method: str) -> Callable:
-        """Combines potential and transform and takes care of gradients and pyro.
+    def _bisect_step_size(
+        self,
+        kernel: Callable,
+        potential_function: Callable,
+        initial_params: Tensor,
+        target_accept_prob: float,
+        num_steps: int = 50,
+        max_num_iterations: int = 10,
+        tolerance: float = 0.05,
+    ) -> Tuple[float, Tensor]:
+        r"""Return an HMC or NUTS step size found by bisection on the acceptance rate.
+
+        Every iteration runs each chain for `num_steps` with a fixed step size, with
+        the chains continuing from where the previous iteration stopped. If the mean
+        acceptance rate across chains is too low, the step size is decreased, if it is
+        too high, it is increased. The search interval is bisected in log-space (and
+        the step size halved or doubled as long as no bound has been found). The step
+        size whose acceptance rate came closest to the target is returned.
+
+        Args:
+            kernel: Pyro `HMC` or `NUTS` kernel class.
+            potential_function: Potential for the Pyro kernel.
+            initial_params: Initial parameters, one row per chain.
+            target_accept_prob: Target for the mean acceptance rate across chains.
+            num_steps: Number of steps per chain in every iteration.
+            max_num_iterations: Maximum number of bisection iterations.
+            tolerance: The search stops if the mean acceptance rate is within this
+                distance to `target_accept_prob`.
+
+        Returns:
+            The step size and the current state of all chains.
+        """
+        step_size, lower, upper = 1.0, 0.0, float("inf")
+        best_step_size, best_distance = step_size, float("inf")
+        for _ in range(max_num_iterations):
+            accept_probs = []
+            chain_states = []
+            for chain_params in initial_params:
+                sampler = MCMC(
+                    kernel=kernel(
+                        potential_fn=potential_function,
+                        step_size=step_size,
+                        adapt_step_size=False,
+                        adapt_mass_matrix=False,
+                    ),
+                    num_samples=num_steps,
+                    warmup_steps=0,
+                    initial_params={self.param_name: chain_params.unsqueeze(0)},
+                    num_chains=1,
+                    disable_progbar=True,
+                    transforms={},
+                )
+                sampler.run()
+                accept_probs.append(sampler.diagnostics()["acceptance rate"]["chain 0"])
+                chain_states.append(
+                    sampler.get_samples()[self.param_name][-1].reshape(1, -1)
+                )
+            initial_params = torch.cat(chain_states).detach()
+
+            mean_accept_prob = sum(accept_probs) / len(accept_probs)
+            distance = abs(mean_accept_prob - target_accept_prob)
+            if distance < best_distance:
+                best_step_size, best_distance = step_size, distance
+            if distance < tolerance:
+                break
+            if mean_accept_prob < target_accept_prob:
+                upper = step_size
+            else:
+                lower = step_size
+            if upper == float("inf"):
+                step_size = 2 * step_size
+            elif lower == 0.0:
+                step_size = step_size / 2
+            else:
+                step_size = sqrt(lower * upper)
+
+        return best_step_size, initial_params
+
+    def _prepare_potential(
+        self, method: str, theta_buffer: Optional[Tensor] = None
+    ) -> Callable:
+        """Combines potential and transform, takes care of gradients and pyro/numpy.
 
         Args:
             method: Which MCMC method to use.
+            theta_buffer: Preallocated buffer for the parameters passed by the numpy
+                slice samplers, see `transformed_potential`.
 
         Returns:
             A potential function that is ready to be used in MCMC.
@@ -581,11 +831,16 @@ class MCMCPosterior(NeuralPosterior):
             theta_transform=self.theta_transform,
             device=self._device,
             track_gradients=track_gradients,
+            theta_buffer=theta_buffer,
         )
         if pyro:
             prepared_potential = partial(
                 pyro_potential_wrapper, potential=prepared_potential
             )
+        else:
+            prepared_potential = partial(
+                numpy_potential_wrapper, potential=prepared_potential
+            )
 
         return prepared_potential
 
@@ -656,6 +911,38 @@ class MCMCPosterior(NeuralPosterior):
             force_update=force_update,
         )
 
+    def __setstate__(self, state_dict: Dict):
+        """Sets the state when being loaded from pickle.
+
+        Attributes that did not exist when the posterior was pickled are set to their
+        defaults.
+
+        Args:
+            state_dict: State to be restored.
+        """
+        warning_msg = ""
+        for key_name, replacement_value in (
+            ("step_size_adaptation", "dual_averaging"),
+            ("warm_start", False),
+            ("adapt_width", False),
+            ("shrink_batch_size", 1),
+            ("use_threads", False),
+            ("_mcmc_init_x", None),
+            ("_warned_log_prob", False),
+        ):
+            state_dict, warning_msg = check_warn_and_setstate(
+                state_dict, key_name, replacement_value, warning_msg
+            )
+        if warning_msg:
+            warn(
+                "The `MCMCPosterior` was pickled with an older version of `sbi`, the "
+                "missing attributes were set to their defaults:" + warning_msg,
+                stacklevel=2,
+            )
+        # Before, Pyro chains always ran in a single sampler.
+        state_dict.setdefault("_pyro_samplers", [state_dict.get("_posterior_sampler")])
+        super().__setstate__(state_dict)
+
     def get_arviz_inference_data(self) -> InferenceData:
         """Returns arviz InferenceData object constructed most recent samples.
 
@@ -688,8 +975,17 @@ class MCMCPosterior(NeuralPosterior):
             transformed_samples = sampler.get_samples(group_by_chain=True)
             # Pyro samplers returns dicts, get values.
             if isinstance(transformed_samples, Dict):
-                # popitem gets last items, [1] get the values as tensor.
-                transformed_samples = transformed_samples.popitem()[1]
+                # popitem gets last items, [1] get the values as tensor. Chains run one
+                # after the other have one sampler each, collect all of them. Their
+                # parameters have a leading batch dimension of one, which is dropped
+                # such that all samples are (chains, draws, dim).
+                chain_samples = [
+                    s.get_samples(group_by_chain=True).popitem()[1]
+                    for s in self._pyro_samplers
+                ]
+                transformed_samples = torch.cat([
+                    samples.reshape(*samples.shape[:2], -1) for samples in chain_samples
+                ])
             # Our slice samplers return numpy arrays.
             elif isinstance(transformed_samples, ndarray):
                 transformed_samples = torch.from_numpy(transformed_samples).type(
@@ -727,3 +1023,16 @@ def _maybe_use_dict_entry(default: Any, key: str, dict_to_check: Dict) -> Any:
     """
     attribute = dict_to_check.get(key, default)
     return attribute
+
+
+def _check_step_size_adaptation(step_size_adaptation: str) -> None:
+    """Raises a `ValueError` if `step_size_adaptation` is not supported.
+
+    It is checked for all methods, such that a typo is not silently ignored by the
+    methods that do not use it.
+    """
+    if step_size_adaptation not in ("dual_averaging", "bisection"):
+        raise ValueError(
+            f"`step_size_adaptation={step_size_adaptation}` is not supported, use "
+            "`dual_averaging` or `bisection`."
+        )
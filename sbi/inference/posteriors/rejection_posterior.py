@@ -1,7 +1,8 @@
 # This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
 # under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
 from functools import partial
-from typing import Any, Callable, Optional, Union
+from math import prod
+from typing import Any, Callable, Dict, Optional, Union
 from warnings import warn
 
 import torch
@@ -64,6 +65,7 @@ class RejectionPosterior(NeuralPosterior):
         self.num_samples_to_find_max = num_samples_to_find_max
         self.num_iter_to_find_max = num_iter_to_find_max
         self.m = m
+        self._warned_log_prob = False
 
         self._purpose = (
             "It provides rejection sampling to .sample() from the posterior and "
@@ -84,13 +86,16 @@ class RejectionPosterior(NeuralPosterior):
         Returns:
             `len($\theta$)`-shaped log-probability.
         """
-        warn(
-            """`.log_prob()` is deprecated for methods that can only evaluate the
-            log-probability up to a normalizing constant. Use `.potential()`
-            instead.""",
-            stacklevel=2,
-        )
-        warn("The log-probability is unnormalized!", stacklevel=2)
+        # Only warn on the first call, `.log_prob()` is often called in a loop.
+        if not self._warned_log_prob:
+            warn(
+                """`.log_prob()` is deprecated for methods that can only evaluate the
+                log-probability up to a normalizing constant. Use `.potential()`
+                instead.""",
+                stacklevel=2,
+            )
+            warn("The log-probability is unnormalized!", stacklevel=2)
+            self._warned_log_prob = True
 
         self.potential_fn.set_x(self._x_else_default_x(x))
 
@@ -123,7 +128,7 @@ class RejectionPosterior(NeuralPosterior):
         Returns:
             Samples from posterior.
         """
-        num_samples = torch.Size(sample_shape).numel()
+        num_samples = prod(sample_shape)
         self.potential_fn.set_x(self._x_else_default_x(x))
 
         potential = partial(self.potential_fn, track_gradients=True)
@@ -167,6 +172,23 @@ class RejectionPosterior(NeuralPosterior):
 
         return samples.reshape((*sample_shape, -1))
 
+    def __setstate__(self, state_dict: Dict):
+        """Sets the state when being loaded from pickle.
+
+        Args:
+            state_dict: State to be restored.
+        """
+        state_dict, warning_msg = utils.check_warn_and_setstate(
+            state_dict, "_warned_log_prob", False
+        )
+        if warning_msg:
+            warn(
+                "The `RejectionPosterior` was pickled with an older version of `sbi`, "
+                "the missing attributes were set to their defaults:" + warning_msg,
+                stacklevel=2,
+            )
+        super().__setstate__(state_dict)
+
     def map(
         self,
         x: Optional[Tensor] = None,
@@ -1,11 +1,13 @@
 # This file is part of sbi, a toolkit for simulation-based inference. sbi is licensed
 # under the Affero General Public License v3, see <https://www.gnu.org/licenses/>.
 
+from contextlib import nullcontext
+from math import log, pi
 from typing import Callable, Optional, Tuple
 
 import torch
 from torch import Tensor
-from torch.distributions import Distribution
+from torch.distributions import Distribution, MultivariateNormal
 
 from sbi.inference.potentials.base_potential import BasePotential
 from sbi.neural_nets.density_estimators import DensityEstimator
@@ -19,6 +21,8 @@ def likelihood_estimator_based_potential(
     prior: Distribution,
     x_o: Optional[Tensor],
     enable_transform: bool = True,
+    eval_dtype: Optional[torch.dtype] = None,
+    compile_log_prob: bool = False,
 ) -> Tuple[Callable, TorchTransform]:
     r"""Returns potential $\log(p(x_o|\theta)p(\theta))$ for likelihood-based methods.
 
@@ -31,6 +35,10 @@ def likelihood_estimator_based_potential(
         x_o: The observed data at which to evaluate the likelihood.
         enable_transform: Whether to transform parameters to unconstrained space.
              When False, an identity transform will be returned for `theta_transform`.
+        eval_dtype: If set, e.g. to `torch.bfloat16`, the likelihood estimator is
+            evaluated in this lower precision, see `LikelihoodBasedPotential`.
+        compile_log_prob: Whether to compile the `log_prob` of the likelihood
+            estimator with `torch.compile`, see `LikelihoodBasedPotential`.
 
     Returns:
         The potential function $p(x_o|\theta)p(\theta)$ and a transformation that maps
@@ -40,7 +48,12 @@ def likelihood_estimator_based_potential(
     device = str(next(likelihood_estimator.parameters()).device)
 
     potential_fn = LikelihoodBasedPotential(
-        likelihood_estimator, prior, x_o, device=device
+        likelihood_estimator,
+        prior,
+        x_o,
+        device=device,
+        eval_dtype=eval_dtype,
+        compile_log_prob=compile_log_prob,
     )
     theta_transform = mcmc_transform(
         prior, device=device, enable_transform=enable_transform
@@ -58,6 +71,8 @@ class LikelihoodBasedPotential(BasePotential):
         prior: Distribution,
         x_o: Optional[Tensor],
         device: str = "cpu",
+        eval_dtype: Optional[torch.dtype] = None,
+        compile_log_prob: bool = False,
     ):
         r"""Returns the potential function for likelihood-based methods.
 
@@ -67,14 +82,112 @@ class LikelihoodBasedPotential(BasePotential):
             x_o: The observed data at which to evaluate the likelihood.
             device: The device to which parameters and data are moved before evaluating
                 the `likelihood_nn`.
+            eval_dtype: If set, e.g. to `torch.bfloat16`, the likelihood estimator is
+                evaluated under `torch.autocast` with this dtype, which roughly halves
+                the memory traffic of its forward pass. The estimator itself is not
+                modified, and the returned potential is still float32. Since MCMC only
+                needs differences of the potential, the loss in precision is often
+                acceptable, but it should be checked for the problem at hand.
+            compile_log_prob: Whether to compile the `log_prob` of the likelihood
+                estimator with `torch.compile` (requires PyTorch 2). The graph is
+                specialized to the shapes of `x_o` and of the batch of parameters, which
+                are fixed during MCMC, and compiled at the first evaluation. This pays
+                off for long chains, but compiling takes a few seconds.
 
         Returns:
             The potential function $p(x_o|\theta)p(\theta)$.
         """
 
-        super().__init__(prior, x_o, device)
+        # Set before `super().__init__()`, which calls `set_x()`.
         self.likelihood_estimator = likelihood_estimator
+        super().__init__(prior, x_o, device)
         self.likelihood_estimator.eval()
+        self.eval_dtype = eval_dtype
+
+        if compile_log_prob and not hasattr(torch, "compile"):
+            raise ImportError("`compile_log_prob=True` requires PyTorch 2.0 or newer.")
+        self.compile_log_prob = compile_log_prob
+        self._compiled_log_prob = None
+
+        # The prior is evaluated at every MCMC step. For a `MultivariateNormal` prior,
+        # the whitening transform `(theta - loc) @ L^{-T}` (with `L` the Cholesky
+        # factor) and the normalizing constant are computed once, such that evaluating
+        # it boils down to a subtraction and a single matrix product. `loc` is
+        # subtracted before the product, since folding it into a bias would cancel
+        # large, nearly equal terms if `loc` is large compared to the prior scale.
+        self._prior_whitening = None
+        if isinstance(prior, MultivariateNormal) and prior.batch_shape == ():
+            dim = prior.event_shape[0]
+            scale_tril_inv = torch.linalg.solve_triangular(
+                prior.scale_tril,
+                torch.eye(dim, dtype=prior.loc.dtype, device=prior.loc.device),
+                upper=False,
+            )
+            self._prior_whitening = scale_tril_inv.T.contiguous()
+            self._prior_loc = prior.loc
+            self._prior_log_norm = (
+                -0.5 * dim * log(2 * pi)
+                - prior.scale_tril.diagonal().log().sum().item()
+            )
+
+    def _add_prior_log_prob(self, log_likelihood: Tensor, theta: Tensor) -> Tensor:
+        r"""Returns $\log(p(x_o|\theta)) + \log(p(\theta))$ given the log-likelihood.
+
+        For a `MultivariateNormal` prior, the prior term is accumulated onto the
+        log-likelihood with a single fused add, without materializing the prior
+        log-probability as a separate tensor.
+        """
+        if self._prior_whitening is None:
+            return log_likelihood + self.prior.log_prob(theta)  # type: ignore
+
+        whitened = torch.matmul(
+            torch.sub(theta, self._prior_loc), self._prior_whitening
+        )
+        return torch.add(log_likelihood, whitened.square_().sum(-1), alpha=-0.5).add_(
+            self._prior_log_norm
+        )
+
+    def __getstate__(self):
+        # Compiled functions can not be pickled, they are compiled again on first use.
+        state = self.__dict__.copy()
+        state["_compiled_log_prob"] = None
+        return state
+
+    def __setstate__(self, state: dict):
+        # Potentials pickled with an older version of `sbi` lack the attributes for the
+        # shortcuts below, which are disabled for them.
+        state.setdefault("_prior_whitening", None)
+        state.setdefault("eval_dtype", None)
+        state.setdefault("compile_log_prob", False)
+        state.setdefault("_compiled_log_prob", None)
+        if "_x_o_trials" not in state:
+            x_o, estimator = state["_x_o"], state["likelihood_estimator"]
+            state["_x_o_trials"] = (
+                None if x_o is None else _stack_iid_trials(x_o, estimator)
+            )
+        self.__dict__ = state
+
+    def _likelihood_log_prob(self) -> Callable:
+        """Returns the `log_prob` of the estimator, compiled if `compile_log_prob`."""
+        if not self.compile_log_prob:
+            return self.likelihood_estimator.log_prob
+        if self._compiled_log_prob is None:
+            self._compiled_log_prob = torch.compile(
+                self.likelihood_estimator.log_prob, dynamic=False
+            )
+        return self._compiled_log_prob
+
+    def set_x(self, x_o: Optional[Tensor]):
+        """Check the shape of the observed data and, if valid, set it.
+
+        `x_o` stays fixed while the potential is evaluated for many `theta`, so its iid
+        trials are stacked for the density estimator (and checked to be on its device)
+        here, once, instead of at every evaluation.
+        """
+        super().set_x(x_o)
+        self._x_o_trials = None
+        if self._x_o is not None:
+            self._x_o_trials = _stack_iid_trials(self._x_o, self.likelihood_estimator)
 
     def __call__(self, theta: Tensor, track_gradients: bool = True) -> Tensor:
         r"""Returns the potential $\log(p(x_o|\theta)p(\theta))$.
@@ -86,20 +199,43 @@ class LikelihoodBasedPotential(BasePotential):
         Returns:
             The potential $\log(p(x_o|\theta)p(\theta))$.
         """
+        if self._x_o_trials is None:
+            raise ValueError(
+                "No observed data is available. Use `potential_fn.set_x(x_o)`."
+            )
 
         # Calculate likelihood over trials and in one batch.
-        log_likelihood_trial_sum = _log_likelihoods_over_trials(
-            x=self.x_o,
+        log_likelihood_trial_sum = _log_likelihoods_over_stacked_trials(
+            x=self._x_o_trials,
             theta=theta.to(self.device),
-            estimator=self.likelihood_estimator,
+            log_prob_fn=self._likelihood_log_prob(),
             track_gradients=track_gradients,
+            eval_dtype=self.eval_dtype,
         )
 
-        return log_likelihood_trial_sum + self.prior.log_prob(theta)  # type: ignore
+        return self._add_prior_log_prob(log_likelihood_trial_sum, theta)
 
 
-def _log_likelihoods_over_trials(
-    x: Tensor, theta: Tensor, estimator: DensityEstimator, track_gradients: bool = False
+def _stack_iid_trials(x: Tensor, estimator: DensityEstimator) -> Tensor:
+    """Return the iid trials of `x` stacked along the first dimension, such that they
+    broadcast against a batch of parameters in the density estimator.
+    """
+    # unsqueeze to ensure that the x-batch dimension is the first dimension for the
+    # broadcasting of the density estimator.
+    x = torch.as_tensor(x).reshape(-1, x.shape[-1]).unsqueeze(1)
+    assert (
+        next(estimator.parameters()).device == x.device
+    ), f"""device mismatch: estimator, x: \
+        {next(estimator.parameters()).device}, {x.device}."""
+    return x
+
+
+def _log_likelihoods_over_stacked_trials(
+    x: Tensor,
+    theta: Tensor,
+    log_prob_fn: Callable,
+    track_gradients: bool = False,
+    eval_dtype: Optional[torch.dtype] = None,
 ) -> Tensor:
     r"""Return log likelihoods summed over iid trials of `x`.
 
@@ -107,32 +243,30 @@ def _log_likelihoods_over_trials(
     to be iid trials, i.e., data generated based on the same paramters /
     experimental conditions.
 
-    Repeats `x` and $\theta$ to cover all their combinations of batch entries.
-
     Args:
-        x: batch of iid data.
+        x: batch of iid data, stacked with `_stack_iid_trials` such that it broadcasts
+            against `theta`.
         theta: batch of parameters.
-        estimator: DensityEstimator.
+        log_prob_fn: The `log_prob` of the density estimator, or a compiled version.
         track_gradients: Whether to track gradients.
+        eval_dtype: If set, `log_prob_fn` is evaluated under `torch.autocast` with
+            this dtype.
 
     Returns:
         log_likelihood_trial_sum: log likelihood for each parameter, summed over all
             batch entries (iid trials) in `x`.
     """
-    # unsqueeze to ensure that the x-batch dimension is the first dimension for the
-    # broadcasting of the density estimator.
-    x = torch.as_tensor(x).reshape(-1, x.shape[-1]).unsqueeze(1)
-    assert (
-        next(estimator.parameters()).device == x.device and x.device == theta.device
-    ), f"""device mismatch: estimator, x, theta: \
-        {next(estimator.parameters()).device}, {x.device},
-        {theta.device}."""
-
+    # Only enter `autocast` when it is needed, since it adds overhead to every op.
+    autocast = (
+        nullcontext()
+        if eval_dtype is None
+        else torch.autocast(device_type=x.device.type, dtype=eval_dtype)
+    )
     # Calculate likelihood in one batch.
-    with torch.set_grad_enabled(track_gradients):
-        log_likelihood_trial_batch = estimator.log_prob(x, condition=theta)
+    with torch.set_grad_enabled(track_gradients), autocast:
+        log_likelihood_trial_batch = log_prob_fn(x, condition=theta)
         # Reshape to (-1, theta_batch_size), sum over trial-log likelihoods.
-        log_likelihood_trial_sum = log_likelihood_trial_batch.sum(0)
+        log_likelihood_trial_sum = log_likelihood_trial_batch.to(theta.dtype).sum(0)
 
     return log_likelihood_trial_sum
 
@@ -141,6 +275,8 @@ def mixed_likelihood_estimator_based_potential(
     likelihood_estimator: MixedDensityEstimator,
     prior: Distribution,
     x_o: Optional[Tensor],
+    eval_dtype: Optional[torch.dtype] = None,
+    compile_log_prob: bool = False,
 ) -> Tuple[Callable, TorchTransform]:
     r"""Returns $\log(p(x_o|\theta)p(\theta))$ for mixed likelihood-based methods.
 
@@ -151,6 +287,9 @@ def mixed_likelihood_estimator_based_potential(
         likelihood_estimator: The neural network modelling the likelihood.
         prior: The prior distribution.
         x_o: The observed data at which to evaluate the likelihood.
+        eval_dtype: Not supported for mixed likelihood estimators yet, must be `None`.
+        compile_log_prob: Not supported for mixed likelihood estimators yet, must be
+            `False`.
 
     Returns:
         The potential function $p(x_o|\theta)p(\theta)$ and a transformation that maps
@@ -160,7 +299,12 @@ def mixed_likelihood_estimator_based_potential(
     device = str(next(likelihood_estimator.discrete_net.parameters()).device)
 
     potential_fn = MixedLikelihoodBasedPotential(
-        likelihood_estimator, prior, x_o, device=device
+        likelihood_estimator,
+        prior,
+        x_o,
+        device=device,
+        eval_dtype=eval_dtype,
+        compile_log_prob=compile_log_prob,
     )
     theta_transform = mcmc_transform(prior, device=device)
 
@@ -174,7 +318,19 @@ class MixedLikelihoodBasedPotential(LikelihoodBasedPotential):
         prior: Distribution,
         x_o: Optional[Tensor],
         device: str = "cpu",
+        eval_dtype: Optional[torch.dtype] = None,
+        compile_log_prob: bool = False,
     ):
+        # The mixed estimator evaluates its discrete and continuous nets in
+        # `log_prob_iid`, which does not support a lower precision or compiling yet.
+        if eval_dtype is not None:
+            raise NotImplementedError(
+                "`eval_dtype` is not supported for mixed likelihood estimators."
+            )
+        if compile_log_prob:
+            raise NotImplementedError(
+                "`compile_log_prob` is not supported for mixed likelihood estimators."
+            )
         # TODO Fix pyright issue by making MixedDensityEstimator a subclass
         # of DensityEstimator
         super().__init__(likelihood_estimator, prior, x_o, device)  # type: ignore
@@ -194,4 +350,4 @@ class MixedLikelihoodBasedPotential(LikelihoodBasedPotential):
                 self.x_o.shape[0], -1
             ).sum(0)
 
-        return log_likelihood_trial_sum + self.prior.log_prob(theta)  # type: ignore
+        return self._add_prior_log_prob(log_likelihood_trial_sum, theta)
@@ -5,6 +5,7 @@
 from copy import deepcopy
 from typing import Any, Callable, Dict, Optional, Union
 
+import torch
 from torch import Tensor
 from torch.distributions import Distribution
 
@@ -62,8 +63,14 @@ class MNLE(LikelihoodEstimator):
                 density_estimator == "mnle"
             ), f"""MNLE can be used with preconfigured 'mnle' density estimator only,
                 not with {density_estimator}."""
-        kwargs = del_entries(locals(), entries=("self", "__class__"))
-        super().__init__(**kwargs)
+        super().__init__(
+            prior=prior,
+            density_estimator=density_estimator,
+            device=device,
+            logging_level=logging_level,
+            summary_writer=summary_writer,
+            show_progress_bars=show_progress_bars,
+        )
 
     def train(
         self,
@@ -98,6 +105,8 @@ class MNLE(LikelihoodEstimator):
         mcmc_parameters: Optional[Dict[str, Any]] = None,
         vi_parameters: Optional[Dict[str, Any]] = None,
         rejection_sampling_parameters: Optional[Dict[str, Any]] = None,
+        eval_dtype: Optional[torch.dtype] = None,
+        compile_log_prob: bool = False,
     ) -> Union[MCMCPosterior, RejectionPosterior, VIPosterior]:
         r"""Build posterior from the neural density estimator.
 
@@ -123,6 +132,8 @@ class MNLE(LikelihoodEstimator):
             vi_parameters: Additional kwargs passed to `VIPosterior`.
             rejection_sampling_parameters: Additional kwargs passed to
                 `RejectionPosterior`.
+            eval_dtype: Not supported for MNLE yet, must be `None`.
+            compile_log_prob: Not supported for MNLE yet, must be `False`.
 
         Returns:
             Posterior $p(\theta|x)$  with `.sample()` and `.log_prob()` methods
@@ -157,7 +168,11 @@ class MNLE(LikelihoodEstimator):
             potential_fn,
             theta_transform,
         ) = mixed_likelihood_estimator_based_potential(
-            likelihood_estimator=likelihood_estimator, prior=prior, x_o=None
+            likelihood_estimator=likelihood_estimator,
+            prior=prior,
+            x_o=None,
+            eval_dtype=eval_dtype,
+            compile_log_prob=compile_log_prob,
         )
 
         if sample_with == "mcmc":
@@ -191,10 +206,13 @@ class MNLE(LikelihoodEstimator):
         else:
             raise NotImplementedError
 
-        # Store models at end of each round.
-        self._model_bank.append(deepcopy(self._posterior))
+        # Store models at end of each round. The posterior is copied only once (such
+        # that it is independent of the network trained in later rounds) and this
+        # copy is shared between the model bank and the caller.
+        posterior = deepcopy(self._posterior)
+        self._model_bank.append(posterior)
 
-        return deepcopy(self._posterior)
+        return posterior
 
     # Temporary: need to rewrite mixed likelihood estimators as DensityEstimator
     # objects.
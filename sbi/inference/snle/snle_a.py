@@ -8,7 +8,6 @@ from torch.distributions import Distribution
 
 from sbi.inference.snle.snle_base import LikelihoodEstimator
 from sbi.types import TensorboardSummaryWriter
-from sbi.utils import del_entries
 
 
 class SNLE_A(LikelihoodEstimator):
@@ -48,5 +47,11 @@ class SNLE_A(LikelihoodEstimator):
                 sampling.
         """
 
-        kwargs = del_entries(locals(), entries=("self", "__class__"))
-        super().__init__(**kwargs)
+        super().__init__(
+            prior=prior,
+            density_estimator=density_estimator,
+            device=device,
+            logging_level=logging_level,
+            summary_writer=summary_writer,
+            show_progress_bars=show_progress_bars,
+        )
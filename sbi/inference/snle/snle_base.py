@@ -270,6 +270,8 @@ class LikelihoodEstimator(NeuralInference, ABC):
         mcmc_parameters: Optional[Dict[str, Any]] = None,
         vi_parameters: Optional[Dict[str, Any]] = None,
         rejection_sampling_parameters: Optional[Dict[str, Any]] = None,
+        eval_dtype: Optional[torch.dtype] = None,
+        compile_log_prob: bool = False,
     ) -> Union[MCMCPosterior, RejectionPosterior, VIPosterior]:
         r"""Build posterior from the neural density estimator.
 
@@ -295,6 +297,10 @@ class LikelihoodEstimator(NeuralInference, ABC):
             vi_parameters: Additional kwargs passed to `VIPosterior`.
             rejection_sampling_parameters: Additional kwargs passed to
                 `RejectionPosterior`.
+            eval_dtype: If set, e.g. to `torch.bfloat16`, the likelihood estimator is
+                evaluated in this lower precision, see `LikelihoodBasedPotential`.
+            compile_log_prob: Whether to compile the `log_prob` of the likelihood
+                estimator with `torch.compile`, see `LikelihoodBasedPotential`.
 
         Returns:
             Posterior $p(\theta|x)$  with `.sample()` and `.log_prob()` methods
@@ -323,6 +329,8 @@ class LikelihoodEstimator(NeuralInference, ABC):
             likelihood_estimator=likelihood_estimator,
             prior=prior,
             x_o=None,
+            eval_dtype=eval_dtype,
+            compile_log_prob=compile_log_prob,
         )
 
         if sample_with == "mcmc":
@@ -356,10 +364,13 @@ class LikelihoodEstimator(NeuralInference, ABC):
         else:
             raise NotImplementedError
 
-        # Store models at end of each round.
-        self._model_bank.append(deepcopy(self._posterior))
+        # Store models at end of each round. The posterior is copied only once (such
+        # that it is independent of the network trained in later rounds) and this
+        # copy is shared between the model bank and the caller.
+        posterior = deepcopy(self._posterior)
+        self._model_bank.append(posterior)
 
-        return deepcopy(self._posterior)
+        return posterior
 
     def _loss(self, theta: Tensor, x: Tensor) -> Tensor:
         r"""Return loss for SNLE, which is the likelihood of $-\log q(x_i | \theta_i)$.
@@ -14,6 +14,13 @@ from tqdm.auto import tqdm, trange
 
 from sbi.simulators.simutils import tqdm_joblib
 
+# States of a chain in `SliceSamplerVectorized`.
+_BEGIN, _LOWER, _UPPER, _SAMPLE_SLICE, _DONE = range(5)
+
+# Ratio of the width of a slice to the expected distance between two points drawn
+# uniformly from it, used to turn step sizes into bracket widths.
+_STEPS_PER_WIDTH = 3.0
+
 
 class MCMCSampler:
     """
@@ -62,6 +69,8 @@ class SliceSampler(MCMCSampler):
         thin=None,
         tuning: int = 50,
         verbose: bool = False,
+        adapt_width: bool = False,
+        shrink_batch_size: int = 1,
     ):
         """Slice sampling for multivariate continuous probability distributions.
 
@@ -75,6 +84,15 @@ class SliceSampler(MCMCSampler):
             thin: Amount of thinning; if None, no thinning.
             tuning: Number of tuning steps for brackets.
             verbose: Whether to show progress bars (False).
+            adapt_width: If False, the width of the brackets is tuned to the mean of
+                the final bracket widths. If True, it is tuned to three times a
+                weighted mean of the step sizes during tuning,
+                `sum_m m * |x_m - x_{m-1}| / (0.5 * M * (M + 1))`, which puts more
+                weight on later steps.
+            shrink_batch_size: Number of points that are drawn from the bracket at once
+                and evaluated with a single call of `lp_f` while shrinking it. Points
+                that lie outside of the bracket once it has been shrunk are skipped.
+                Values larger than one require `lp_f` to accept a batch of states.
         """
 
         MCMCSampler.__init__(self, x, lp_f, thin, verbose=verbose)
@@ -82,6 +100,8 @@ class SliceSampler(MCMCSampler):
         self.init_width = init_width
         self.width = None
         self.tuning = tuning
+        self.adapt_width = adapt_width
+        self.shrink_batch_size = shrink_batch_size
 
     def gen(
         self,
@@ -122,11 +142,12 @@ class SliceSampler(MCMCSampler):
                 rng.shuffle(order)
 
                 for i in order:
-                    self.x[i], _ = self._sample_from_conditional(i, self.x[i], rng)
+                    self.x[i], _, self.L = self._sample_from_conditional(
+                        i, self.x[i], rng, log_prob=self.L
+                    )
 
             samples[n] = self.x.copy()
 
-            self.L = self.lp_f(self.x)
             # logger.write('sample = {0}, log prob = {1:.2}\n'.format(n+1, self.L))
 
             if show_info:
@@ -154,6 +175,7 @@ class SliceSampler(MCMCSampler):
         order = list(range(self.n_dims))
         x = self.x.copy()
         self.width = np.full(self.n_dims, self.init_width)
+        weighted_steps = np.zeros(self.n_dims)
 
         tbar = trange(self.tuning, miniters=10, disable=not self.verbose)
         tbar.set_description("Tuning bracket width...")
@@ -162,10 +184,17 @@ class SliceSampler(MCMCSampler):
             rng.shuffle(order)
 
             for i in range(self.n_dims):
-                x[i], wi = self._sample_from_conditional(i, x[i], rng)
-                self.width[i] += (wi - self.width[i]) / (n + 1)
+                xi, wi, _ = self._sample_from_conditional(i, x[i], rng)
+                if self.adapt_width:
+                    weighted_steps[i] += (n + 1) * np.abs(xi - x[i])
+                    self.width[i] = (
+                        _STEPS_PER_WIDTH * weighted_steps[i] / (0.5 * (n + 1) * (n + 2))
+                    )
+                else:
+                    self.width[i] += (wi - self.width[i]) / (n + 1)
+                x[i] = xi
 
-    def _sample_from_conditional(self, i: int, cxi, rng):
+    def _sample_from_conditional(self, i: int, cxi, rng, log_prob=None):
         """
         Samples uniformly from conditional by constructing a bracket.
 
@@ -173,18 +202,28 @@ class SliceSampler(MCMCSampler):
             i: conditional to sample from
             cxi: current state of variable to sample
             rng: random number generator to use
+            log_prob: log prob of the current state, if already known. Passing it
+                saves one evaluation of `lp_f` per call.
 
         Returns:
-            new state, final bracket width
+            new state, final bracket width, log prob of the new state
         """
         assert self.width is not None, "Chain not initialized."
 
-        # conditional log prob
-        Li = lambda t: self.lp_f(np.concatenate([self.x[:i], [t], self.x[i + 1 :]]))
+        # conditional log prob, evaluated on a single buffer in which only the i-th
+        # entry is overwritten (avoids allocating a new state for every evaluation).
+        x = self.x.copy()
+
+        def Li(t):
+            x[i] = t
+            return self.lp_f(x)
+
         wi = self.width[i]
 
         # sample a slice uniformly
-        logu = Li(cxi) + np.log(1.0 - rng.rand())
+        if log_prob is None:
+            log_prob = Li(cxi)
+        logu = log_prob + np.log(1.0 - rng.rand())
 
         # position the bracket randomly around the current sample
         lx = cxi - wi * rng.rand()
@@ -198,18 +237,59 @@ class SliceSampler(MCMCSampler):
         while Li(ux) >= logu and ux - cxi < self.max_width:
             ux += wi
 
+        if self.shrink_batch_size > 1:
+            return self._shrink_batched(x, i, cxi, lx, ux, logu, rng)
+
         # sample uniformly from bracket
         xi = (ux - lx) * rng.rand() + lx
 
         # if outside slice, reject sample and shrink bracket
-        while Li(xi) < logu:
+        log_prob_xi = Li(xi)
+        while log_prob_xi < logu:
             if xi < cxi:
                 lx = xi
             else:
                 ux = xi
             xi = (ux - lx) * rng.rand() + lx
+            log_prob_xi = Li(xi)
 
-        return xi, ux - lx
+        return xi, ux - lx, log_prob_xi
+
+    def _shrink_batched(self, x, i: int, cxi, lx, ux, logu, rng):
+        """
+        Samples uniformly from the slice within the bracket `[lx, ux)`, evaluating
+        `shrink_batch_size` candidates per call of `lp_f`.
+
+        The candidates are uniform in the bracket at the time they were drawn. Those
+        inside the shrunk bracket are therefore uniform within it, such that skipping
+        all others gives the same distribution as drawing one candidate at a time.
+
+        Args:
+            x: state in which the i-th entry is replaced by the candidates
+            i: conditional to sample from
+            cxi: current state of variable to sample
+            lx, ux: lower and upper end of the bracket
+            logu: log height of the slice
+            rng: random number generator to use
+
+        Returns:
+            new state, final bracket width, log prob of the new state
+        """
+        candidates = np.tile(x, (self.shrink_batch_size, 1))
+        while True:
+            xis = (ux - lx) * rng.rand(self.shrink_batch_size) + lx
+            candidates[:, i] = xis
+            log_probs = np.asarray(self.lp_f(candidates), dtype=float).reshape(-1)
+            for xi, log_prob_xi in zip(xis, log_probs):
+                if not lx <= xi < ux:
+                    continue
+                if log_prob_xi >= logu:
+                    return xi, ux - lx, log_prob_xi
+                # outside slice, reject sample and shrink bracket
+                if xi < cxi:
+                    lx = xi
+                else:
+                    ux = xi
 
 
 class SliceSamplerSerial:
@@ -224,6 +304,9 @@ class SliceSamplerSerial:
         init_width: Union[float, np.ndarray] = 0.01,
         max_width: float = float("inf"),
         num_workers: int = 1,
+        adapt_width: bool = False,
+        shrink_batch_size: int = 1,
+        use_threads: bool = False,
     ):
         """Slice sampler in pure Numpy, running for each chain in serial.
 
@@ -239,6 +322,14 @@ class SliceSamplerSerial:
             init_width: Inital width of brackets.
             max_width: Maximum width of brackets.
             num_workers: Number of parallel workers to use.
+            adapt_width: Whether to tune the bracket widths to the step sizes instead
+                of the final bracket widths, see `SliceSampler`.
+            shrink_batch_size: Number of candidates evaluated at once while shrinking
+                the bracket, see `SliceSampler`.
+            use_threads: Whether the workers are threads instead of processes. Threads
+                avoid pickling `log_prob_fn` and starting processes, and run in
+                parallel while `log_prob_fn` releases the GIL (e.g., in PyTorch ops).
+                `log_prob_fn` must then be thread-safe.
         """
         self._log_prob_fn = log_prob_fn
 
@@ -250,6 +341,9 @@ class SliceSamplerSerial:
 
         self.init_width = init_width
         self.max_width = max_width
+        self.adapt_width = adapt_width
+        self.shrink_batch_size = shrink_batch_size
+        self.use_threads = use_threads
 
         self.n_dims = self.x.size
         self.num_workers = num_workers
@@ -283,7 +377,10 @@ class SliceSamplerSerial:
                 total=self.num_chains,
             )
         ):
-            all_samples = Parallel(n_jobs=self.num_workers)(
+            all_samples = Parallel(
+                n_jobs=self.num_workers,
+                prefer="threads" if self.use_threads else "processes",
+            )(
                 delayed(self.run_fun)(num_samples, initial_params_batch, seed)
                 for initial_params_batch, seed in zip(self.x, seeds)
             )
@@ -299,7 +396,9 @@ class SliceSamplerSerial:
 
     def run_fun(self, num_samples, inits, seed) -> np.ndarray:
         """Runs MCMC for a given number of samples starting at inits."""
-        np.random.seed(seed)
+        # Every chain has its own random state, such that chains running in threads
+        # do not share the global one.
+        rng = np.random.RandomState(int(seed))
         posterior_sampler = SliceSampler(
             inits,
             lp_f=self._log_prob_fn,
@@ -309,8 +408,10 @@ class SliceSamplerSerial:
             tuning=self.tuning,
             # turn off pbars in parallel mode.
             verbose=self.num_workers == 1 and self.verbose,
+            adapt_width=self.adapt_width,
+            shrink_batch_size=self.shrink_batch_size,
         )
-        return posterior_sampler.gen(num_samples)
+        return posterior_sampler.gen(num_samples, rng=rng)
 
     def get_samples(
         self, num_samples: Optional[int] = None, group_by_chain: bool = True
@@ -358,6 +459,7 @@ class SliceSamplerVectorized:
         init_width: Union[float, np.ndarray] = 0.01,
         max_width: float = float("inf"),
         num_workers: int = 1,
+        adapt_width: bool = False,
     ):
         """Slice sampler in pure Numpy, vectorized evaluations across chains.
 
@@ -371,6 +473,8 @@ class SliceSamplerVectorized:
             init_width: Inital width of brackets.
             max_width: Maximum width of brackets.
             num_workers: Number of parallel workers to use (not implemented.)
+            adapt_width: Whether to tune the bracket widths to the step sizes instead
+                of the final bracket widths, see `SliceSampler`.
         """
         self._log_prob_fn = log_prob_fn
 
@@ -382,6 +486,7 @@ class SliceSamplerVectorized:
 
         self.init_width = init_width
         self.max_width = max_width
+        self.adapt_width = adapt_width
 
         self.n_dims = self.x.size
 
@@ -398,16 +503,15 @@ class SliceSamplerVectorized:
 
     def _reset(self):
         self.rng = np.random  # type: ignore
-        self.state = {}
-        for c in range(self.num_chains):
-            self.state[c] = {}
-            self.state[c]["t"] = 0
-            self.state[c]["width"] = None
-            self.state[c]["x"] = None
 
     def run(self, num_samples: int) -> np.ndarray:
         """Runs MCMC
 
+        All chains are advanced in lockstep: every iteration evaluates the potential
+        once on a `(num_chains, dim)` batch, and each chain is moved through the states
+        of the slice sampler (position bracket, step out lower and upper end, shrink)
+        with boolean masks instead of a Python loop over chains.
+
         Args:
             num_samples: Number of samples to generate
 
@@ -416,21 +520,21 @@ class SliceSamplerVectorized:
         """
         assert num_samples >= 0
 
-        self.n_dims = self.x.shape[1]
+        num_chains, self.n_dims = self.x.shape
+        chains = np.arange(num_chains)
 
-        # Init chains
-        for c in range(self.num_chains):
-            self.state[c]["x"] = self.x[c, :]
+        # Init chains.
+        x = np.array(self.x, dtype=float)
+        width = np.full((num_chains, self.n_dims), self.init_width, dtype=float)
+        weighted_steps = np.zeros((num_chains, self.n_dims))
+        order = np.argsort(self.rng.rand(num_chains, self.n_dims), axis=1)
+        i = np.zeros(num_chains, dtype=int)
+        t = np.zeros(num_chains, dtype=int)
+        samples = np.empty([num_chains, int(num_samples), int(self.n_dims)])
 
-            self.state[c]["i"] = 0
-            self.state[c]["order"] = list(range(self.n_dims))
-            self.rng.shuffle(self.state[c]["order"])
-
-            self.state[c]["samples"] = np.empty([int(num_samples), int(self.n_dims)])
-
-            self.state[c]["state"] = "BEGIN"
-
-            self.state[c]["width"] = np.full(self.n_dims, self.init_width)
+        state = np.full(num_chains, _BEGIN if num_samples > 0 else _DONE)
+        cxi, wi, logu, lx, ux, xi = (np.zeros(num_chains) for _ in range(6))
+        next_param = x.copy()
 
         if self.verbose:
             pbar = tqdm(
@@ -438,134 +542,96 @@ class SliceSamplerVectorized:
                 desc=f"Running vectorized MCMC with {self.num_chains} chains",
             )
 
-        num_chains_finished = 0
-        while num_chains_finished != self.num_chains:
-            num_chains_finished = 0
-
-            for sc in self.state.values():
-                if sc["state"] == "BEGIN":
-                    sc["cxi"] = sc["x"][sc["order"][sc["i"]]]
-                    sc["wi"] = sc["width"][sc["order"][sc["i"]]]
-                    sc["next_param"] = np.concatenate([
-                        sc["x"][: sc["order"][sc["i"]]],
-                        [sc["cxi"]],
-                        sc["x"][sc["order"][sc["i"]] + 1 :],
-                    ])
-
-            params = np.stack([sc["next_param"] for sc in self.state.values()])
-            log_probs = self._log_prob_fn(params)
-
-            for c in range(self.num_chains):
-                sc = self.state[c]
-
-                if sc["state"] == "BEGIN":
-                    # position the bracket randomly around the current sample
-                    sc["logu"] = log_probs[c] + np.log(1.0 - self.rng.rand())
-                    sc["lx"] = sc["cxi"] - sc["wi"] * self.rng.rand()
-                    sc["ux"] = sc["lx"] + sc["wi"]
-                    sc["next_param"] = np.concatenate([
-                        sc["x"][: sc["order"][sc["i"]]],
-                        [sc["lx"]],
-                        sc["x"][sc["order"][sc["i"]] + 1 :],
-                    ])
-                    sc["state"] = "LOWER"
-
-                elif sc["state"] == "LOWER":
-                    outside_lower = (
-                        log_probs[c] >= sc["logu"]
-                        and sc["cxi"] - sc["lx"] < self.max_width
-                    )
+        while not np.all(state == _DONE):
+            dim = order[chains, i]
 
-                    if outside_lower:
-                        sc["lx"] -= sc["wi"]
-                        sc["next_param"] = np.concatenate([
-                            sc["x"][: sc["order"][sc["i"]]],
-                            [sc["lx"]],
-                            sc["x"][sc["order"][sc["i"]] + 1 :],
-                        ])
-
-                    else:
-                        sc["next_param"] = np.concatenate([
-                            sc["x"][: sc["order"][sc["i"]]],
-                            [sc["ux"]],
-                            sc["x"][sc["order"][sc["i"]] + 1 :],
-                        ])
-                        sc["state"] = "UPPER"
-
-                elif sc["state"] == "UPPER":
-                    outside_upper = (
-                        log_probs[c] >= sc["logu"]
-                        and sc["ux"] - sc["cxi"] < self.max_width
-                    )
+            begin = state == _BEGIN
+            cxi[begin] = x[begin, dim[begin]]
+            wi[begin] = width[begin, dim[begin]]
+            next_param[begin] = x[begin]
+
+            log_probs = np.asarray(self._log_prob_fn(next_param), dtype=float)
+            log_probs = log_probs.reshape(num_chains)
+
+            # Masks of the states at the start of this iteration.
+            lower = state == _LOWER
+            upper = state == _UPPER
+            sample_slice = state == _SAMPLE_SLICE
+
+            # position the bracket randomly around the current sample
+            logu[begin] = log_probs[begin] + np.log(
+                1.0 - self.rng.rand(num_chains)[begin]
+            )
+            lx[begin] = cxi[begin] - wi[begin] * self.rng.rand(num_chains)[begin]
+            ux[begin] = lx[begin] + wi[begin]
+            next_param[begin, dim[begin]] = lx[begin]
+            state[begin] = _LOWER
+
+            # find lower bracket end
+            inside = (log_probs >= logu) & (cxi - lx < self.max_width)
+            step_out = lower & inside
+            lx[step_out] -= wi[step_out]
+            next_param[step_out, dim[step_out]] = lx[step_out]
+            done_lower = lower & ~inside
+            next_param[done_lower, dim[done_lower]] = ux[done_lower]
+            state[done_lower] = _UPPER
+
+            # find upper bracket end
+            inside = (log_probs >= logu) & (ux - cxi < self.max_width)
+            step_out = upper & inside
+            ux[step_out] += wi[step_out]
+            next_param[step_out, dim[step_out]] = ux[step_out]
+            # sample uniformly from bracket
+            done_upper = upper & ~inside
+            xi[done_upper] = (ux - lx)[done_upper] * self.rng.rand(num_chains)[
+                done_upper
+            ] + lx[done_upper]
+            next_param[done_upper, dim[done_upper]] = xi[done_upper]
+            state[done_upper] = _SAMPLE_SLICE
+
+            # if outside slice, reject sample and shrink bracket
+            rejected = sample_slice & (log_probs < logu)
+            shrink_lower = rejected & (xi < cxi)
+            shrink_upper = rejected & (xi >= cxi)
+            lx[shrink_lower] = xi[shrink_lower]
+            ux[shrink_upper] = xi[shrink_upper]
+            xi[rejected] = (ux - lx)[rejected] * self.rng.rand(num_chains)[
+                rejected
+            ] + lx[rejected]
+            next_param[rejected, dim[rejected]] = xi[rejected]
+
+            accepted = sample_slice & ~rejected
+            x[accepted] = next_param[accepted]
+            state[accepted] = _BEGIN
+
+            tune = accepted & (t <= self.tuning)
+            if self.adapt_width:
+                weighted_steps[tune, dim[tune]] += (t[tune] + 1) * np.abs(
+                    (xi - cxi)[tune]
+                )
+                width[tune, dim[tune]] = (
+                    _STEPS_PER_WIDTH
+                    * weighted_steps[tune, dim[tune]]
+                    / (0.5 * (t[tune] + 1) * (t[tune] + 2))
+                )
+            else:
+                width[tune, dim[tune]] += ((ux - lx)[tune] - width[tune, dim[tune]]) / (
+                    t[tune] + 1
+                )
+
+            # Chains that updated their last dimension complete a sample.
+            sweep_done = accepted & (i == self.n_dims - 1)
+            i[accepted & ~sweep_done] += 1
+            samples[sweep_done, t[sweep_done]] = x[sweep_done]
+            t[sweep_done] += 1
+            i[sweep_done] = 0
+            order[sweep_done] = np.argsort(
+                self.rng.rand(int(sweep_done.sum()), self.n_dims), axis=1
+            )
+            state[sweep_done & (t >= num_samples)] = _DONE
 
-                    if outside_upper:
-                        sc["ux"] += sc["wi"]
-                        sc["next_param"] = np.concatenate([
-                            sc["x"][: sc["order"][sc["i"]]],
-                            [sc["ux"]],
-                            sc["x"][sc["order"][sc["i"]] + 1 :],
-                        ])
-                    else:
-                        # sample uniformly from bracket
-                        sc["xi"] = (sc["ux"] - sc["lx"]) * self.rng.rand() + sc["lx"]
-                        sc["next_param"] = np.concatenate([
-                            sc["x"][: sc["order"][sc["i"]]],
-                            [sc["xi"]],
-                            sc["x"][sc["order"][sc["i"]] + 1 :],
-                        ])
-                        sc["state"] = "SAMPLE_SLICE"
-
-                elif sc["state"] == "SAMPLE_SLICE":
-                    # if outside slice, reject sample and shrink bracket
-                    rejected = log_probs[c] < sc["logu"]
-
-                    if rejected:
-                        if sc["xi"] < sc["cxi"]:
-                            sc["lx"] = sc["xi"]
-                        else:
-                            sc["ux"] = sc["xi"]
-                        sc["xi"] = (sc["ux"] - sc["lx"]) * self.rng.rand() + sc["lx"]
-                        sc["next_param"] = np.concatenate([
-                            sc["x"][: sc["order"][sc["i"]]],
-                            [sc["xi"]],
-                            sc["x"][sc["order"][sc["i"]] + 1 :],
-                        ])
-
-                    else:
-                        if sc["t"] < num_samples:
-                            sc["state"] = "BEGIN"
-
-                            sc["x"] = sc["next_param"].copy()
-
-                            if sc["t"] <= (self.tuning):
-                                i = sc["order"][sc["i"]]
-                                sc["width"][i] += (
-                                    (sc["ux"] - sc["lx"]) - sc["width"][i]
-                                ) / (sc["t"] + 1)
-
-                            if sc["i"] < len(sc["order"]) - 1:
-                                sc["i"] += 1
-
-                            else:
-                                if sc["t"] > self.tuning:
-                                    sc["samples"][sc["t"]] = sc["x"].copy()
-
-                                sc["t"] += 1
-
-                                self.state[c]["i"] = 0
-                                self.state[c]["order"] = list(range(self.n_dims))
-                                self.rng.shuffle(self.state[c]["order"])
-
-                                if self.verbose and sc["t"] % 10 == 0:
-                                    pbar.update(10)  # type: ignore
-
-                        else:
-                            sc["state"] = "DONE"
-
-                if sc["state"] == "DONE":
-                    num_chains_finished += 1
-
-        samples = np.stack([self.state[c]["samples"] for c in range(self.num_chains)])
+            if self.verbose and sweep_done.any():
+                pbar.update(int(sweep_done.sum()))  # type: ignore
 
         samples = samples[:, :: self.thin, :]  # thin chains
 
@@ -1,11 +1,11 @@
-from typing import Callable, Dict, Union
+from typing import Callable, Dict, Optional, Union
 
 import numpy as np
 import torch
 import torch.distributions.transforms as torch_tf
 from torch import Tensor
 
-from sbi.utils.torchutils import ensure_theta_batched
+from sbi.utils.torchutils import ensure_theta_batched, tensor2numpy
 
 
 def transformed_potential(
@@ -14,6 +14,7 @@ def transformed_potential(
     theta_transform: torch_tf.Transform,
     device: str,
     track_gradients: bool = False,
+    theta_buffer: Optional[Tensor] = None,
 ) -> Tensor:
     """Return potential after a transformation by adding the log-abs-determinant.
 
@@ -27,12 +28,30 @@ def transformed_potential(
         device: The device to which to move the parameters before evaluation.
         track_gradients: Whether to track the gradients of the `potential_fn`
             evaluation.
+        theta_buffer: Preallocated float32 tensor of shape (batch_size,
+            shape_of_single_theta) on `device`. If `theta` is a numpy array holding
+            `batch_size` parameters, it is copied into this buffer instead of being
+            converted into a newly allocated tensor.
     """
 
     # Device is the same for net and prior.
-    transformed_theta = ensure_theta_batched(
-        torch.as_tensor(theta, dtype=torch.float32)
-    ).to(device)
+    if (
+        theta_buffer is not None
+        and isinstance(theta, np.ndarray)
+        and theta.ndim > 0
+        and theta.size == theta_buffer.numel()
+        and theta.shape[-1] == theta_buffer.shape[-1]
+    ):
+        if theta_buffer.device.type == "cpu":
+            # Writing through a numpy view avoids the torch dispatch of `copy_`.
+            np.copyto(theta_buffer.numpy(), theta.reshape(theta_buffer.shape))
+        else:
+            theta_buffer.copy_(torch.from_numpy(theta).reshape(theta_buffer.shape))
+        transformed_theta = theta_buffer
+    else:
+        transformed_theta = ensure_theta_batched(
+            torch.as_tensor(theta, dtype=torch.float32)
+        ).to(device)
     # Transform `theta` from transformed (i.e. unconstrained) to untransformed
     # space.
     theta = theta_transform.inv(transformed_theta)  # type: ignore
@@ -60,3 +79,23 @@ def pyro_potential_wrapper(theta: Dict[str, Tensor], potential: Callable) -> Cal
 
     # Note the minus to match the pyro potential function requirements.
     return -potential(theta_tensor)
+
+
+def numpy_potential_wrapper(theta: np.ndarray, potential: Callable) -> np.ndarray:
+    r"""Evaluate numpy-based `theta` under the `potential` and return a numpy array.
+
+    The potential is evaluated on the device it lives on (e.g. on the GPU) and only
+    the resulting log-probabilities are copied back to the host, once per call. This
+    way, the numpy samplers compare plain floats instead of synchronizing with the
+    device for every single comparison.
+
+    Args:
+        theta: Parameters $\theta$, either of shape (shape_of_single_theta) or
+            (batch_size, shape_of_single_theta).
+        potential: Potential which to evaluate.
+
+    Returns:
+        The potential $\log r(x_o, \theta) + \log p(\theta)$ as numpy array.
+    """
+
+    return tensor2numpy(potential(theta))
@@ -507,3 +507,60 @@ def test_api_snl_sampling_methods(
             posterior.train(max_num_iters=10)
 
         posterior.sample(sample_shape=(num_samples,))
+
+
+def test_snle_build_posterior_with_eval_dtype():
+    """Test that `build_posterior` evaluates the likelihood estimator in bfloat16."""
+    num_dim = 2
+    prior = MultivariateNormal(loc=zeros(num_dim), covariance_matrix=eye(num_dim))
+    theta = prior.sample((500,))
+    x = diagonal_linear_gaussian(theta)
+    x_o = zeros((1, num_dim))
+
+    inference = SNLE(prior, show_progress_bars=False)
+    inference.append_simulations(theta, x).train(max_num_epochs=5)
+    build_kwargs = dict(
+        mcmc_method="slice_np_vectorized",
+        mcmc_parameters=dict(num_chains=10, thin=5, warmup_steps=10),
+    )
+    posterior = inference.build_posterior(**build_kwargs).set_default_x(x_o)
+    posterior_bf16 = inference.build_posterior(
+        **build_kwargs, eval_dtype=torch.bfloat16
+    ).set_default_x(x_o)
+
+    assert posterior_bf16.potential_fn.eval_dtype == torch.bfloat16
+    assert torch.allclose(
+        posterior.log_prob(theta[:100]), posterior_bf16.log_prob(theta[:100]), atol=0.2
+    )
+    samples = posterior_bf16.sample((10,), show_progress_bars=False)
+    assert samples.shape == (10, num_dim)
+
+
+@pytest.mark.skipif(not hasattr(torch, "compile"), reason="Requires torch.compile.")
+def test_snle_build_posterior_with_compiled_log_prob():
+    """Test that `build_posterior` can compile the `log_prob` of the estimator."""
+    num_dim = 2
+    prior = MultivariateNormal(loc=zeros(num_dim), covariance_matrix=eye(num_dim))
+    theta = prior.sample((500,))
+    x = diagonal_linear_gaussian(theta)
+    x_o = zeros((1, num_dim))
+
+    inference = SNLE(prior, show_progress_bars=False)
+    inference.append_simulations(theta, x).train(max_num_epochs=5)
+    build_kwargs = dict(
+        mcmc_method="slice_np_vectorized",
+        mcmc_parameters=dict(num_chains=10, thin=5, warmup_steps=10),
+    )
+    posterior = inference.build_posterior(**build_kwargs).set_default_x(x_o)
+    posterior_compiled = inference.build_posterior(
+        **build_kwargs, compile_log_prob=True
+    ).set_default_x(x_o)
+
+    samples = posterior_compiled.sample((10,), show_progress_bars=False)
+    assert samples.shape == (10, num_dim)
+    assert posterior_compiled.potential_fn._compiled_log_prob is not None
+    assert torch.allclose(
+        posterior.log_prob(theta[:100]),
+        posterior_compiled.log_prob(theta[:100]),
+        atol=1e-4,
+    )
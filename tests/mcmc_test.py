@@ -3,12 +3,14 @@
 
 from __future__ import annotations
 
+import threading
+
 import arviz as az
 import numpy as np
 import pytest
 import torch
 from torch import eye, ones, zeros
-from torch.distributions import Uniform
+from torch.distributions import MultivariateNormal, Uniform
 
 from sbi.inference import (
     SNLE,
@@ -31,11 +33,17 @@ from tests.test_utils import check_c2st
 
 
 @pytest.mark.parametrize("num_dim", (1, 2))
-def test_c2st_slice_np_on_Gaussian(num_dim: int):
+@pytest.mark.parametrize("adapt_width", (False, True))
+@pytest.mark.parametrize("shrink_batch_size", (1, 4))
+def test_c2st_slice_np_on_Gaussian(
+    num_dim: int, adapt_width: bool, shrink_batch_size: int
+):
     """Test MCMC on Gaussian, comparing to ground truth target via c2st.
 
     Args:
         num_dim: parameter dimension of the gaussian model
+        adapt_width: whether to tune the bracket widths to the step sizes
+        shrink_batch_size: number of candidates evaluated at once while shrinking
 
     """
     warmup = 100
@@ -58,6 +66,8 @@ def test_c2st_slice_np_on_Gaussian(num_dim: int):
         lp_f=lp_f,
         x=np.zeros((num_dim,)).astype(np.float32),
         tuning=warmup,
+        adapt_width=adapt_width,
+        shrink_batch_size=shrink_batch_size,
     )
     warmup_samples = sampler.gen(warmup)
     assert warmup_samples.shape == (warmup, num_dim)
@@ -73,13 +83,15 @@ def test_c2st_slice_np_on_Gaussian(num_dim: int):
 @pytest.mark.parametrize("num_dim", (1, 2))
 @pytest.mark.parametrize("slice_sampler", (SliceSamplerVectorized, SliceSamplerSerial))
 @pytest.mark.parametrize("num_workers", (1, 2))
+@pytest.mark.parametrize("adapt_width", (False, True))
 def test_c2st_slice_np_vectorized_parallelized_on_Gaussian(
-    num_dim: int, slice_sampler, num_workers: int
+    num_dim: int, slice_sampler, num_workers: int, adapt_width: bool
 ):
     """Test MCMC on Gaussian, comparing to ground truth target via c2st.
 
     Args:
         num_dim: parameter dimension of the gaussian model
+        adapt_width: whether to tune the bracket widths to the step sizes
 
     """
     num_samples = 500
@@ -107,6 +119,7 @@ def test_c2st_slice_np_vectorized_parallelized_on_Gaussian(
         thin=thin,
         num_chains=num_chains,
         num_workers=num_workers,
+        adapt_width=adapt_width,
     )
     samples = sampler.run(thin * (warmup + int(num_samples / num_chains)))
     assert samples.shape == (
@@ -137,7 +150,8 @@ def test_c2st_slice_np_vectorized_parallelized_on_Gaussian(
         "slice_np_vectorized",
     ),
 )
-def test_getting_inference_diagnostics(method):
+@pytest.mark.parametrize("num_chains", (1, 2))
+def test_getting_inference_diagnostics(method, num_chains):
     num_simulations = 100
     num_samples = 10
     num_dim = 2
@@ -169,12 +183,169 @@ def test_getting_inference_diagnostics(method):
         theta_transform=theta_transform,
         thin=2,
         warmup_steps=10,
-        num_chains=1,
+        num_chains=num_chains,
     )
     posterior.sample(
         sample_shape=(num_samples,),
         method=method,
     )
     idata = posterior.get_arviz_inference_data()
+    assert idata.posterior["theta"].shape[0] == num_chains
+    assert idata.posterior["theta"].shape[2:] == (num_dim,)
 
     az.plot_trace(idata)
+
+
+# Settings of the Gaussian posterior on which the sampling options are tested.
+num_dim_gaussian = 2
+num_samples_gaussian = 400
+
+
+def _gaussian_mcmc_posterior(method: str, **kwargs):
+    """Returns an `MCMCPosterior` for a Gaussian target, its target distribution, and
+    a list into which each evaluation of the potential appends the shape of the
+    evaluated parameters and the identifier of the thread that evaluated them.
+
+    Args:
+        method: MCMC method.
+        kwargs: Passed to `MCMCPosterior`, overriding the defaults below.
+    """
+    target_distribution = MultivariateNormal(
+        ones(num_dim_gaussian), 0.1 * eye(num_dim_gaussian)
+    )
+    potential_calls = []
+
+    def potential(theta, x_o):
+        potential_calls.append((tuple(theta.shape), threading.get_ident()))
+        return target_distribution.log_prob(theta)
+
+    posterior_kwargs = dict(thin=5, warmup_steps=20, num_chains=2)
+    posterior_kwargs.update(kwargs)
+    posterior = MCMCPosterior(
+        potential_fn=potential,
+        proposal=MultivariateNormal(zeros(num_dim_gaussian), eye(num_dim_gaussian)),
+        method=method,
+        **posterior_kwargs,
+    )
+    return posterior, target_distribution, potential_calls
+
+
+def _sample_and_check_c2st(posterior, target_distribution, method: str, **kwargs):
+    """Samples from the Gaussian `posterior` and compares it to its target."""
+    samples = posterior.sample(
+        (num_samples_gaussian,),
+        x=zeros(1, num_dim_gaussian),
+        show_progress_bars=False,
+        **kwargs,
+    )
+    check_c2st(samples, target_distribution.sample((num_samples_gaussian,)), alg=method)
+
+
+@pytest.mark.parametrize("method", ("hmc", "nuts"))
+def test_bisection_step_size_adaptation(method, monkeypatch):
+    """Test HMC and NUTS with bisection step size adaptation on a Gaussian."""
+    posterior, target_distribution, _ = _gaussian_mcmc_posterior(
+        method, step_size_adaptation="bisection"
+    )
+    step_sizes = []
+    bisect_step_size = posterior._bisect_step_size
+
+    def recording_bisect_step_size(*args, **kwargs):
+        step_size, initial_params = bisect_step_size(*args, **kwargs)
+        step_sizes.append(step_size)
+        return step_size, initial_params
+
+    monkeypatch.setattr(posterior, "_bisect_step_size", recording_bisect_step_size)
+    _sample_and_check_c2st(posterior, target_distribution, method)
+
+    # The bisected step size is frozen during warmup and sampling of every chain.
+    assert len(step_sizes) == 1
+    accept_probs = []
+    for sampler in posterior._pyro_samplers:
+        assert sampler.kernel.step_size == step_sizes[0]
+        assert not sampler.kernel._adapter.adapt_step_size
+        accept_probs += sampler.diagnostics()["acceptance rate"].values()
+    target_accept_prob = 0.7 if method == "hmc" else 0.8
+    assert abs(np.mean(accept_probs) - target_accept_prob) < 0.1
+
+
+@pytest.mark.parametrize("method", ("slice_np", "slice_np_vectorized", "nuts"))
+def test_invalid_step_size_adaptation(method):
+    """Test that an unknown `step_size_adaptation` is rejected for every method."""
+    with pytest.raises(ValueError, match="step_size_adaptation"):
+        _gaussian_mcmc_posterior(method, step_size_adaptation="bisecton")
+
+    posterior, _, _ = _gaussian_mcmc_posterior(method)
+    with pytest.raises(ValueError, match="step_size_adaptation"):
+        posterior.sample(
+            (10,),
+            x=zeros(1, num_dim_gaussian),
+            step_size_adaptation="bisecton",
+            show_progress_bars=False,
+        )
+
+
+@pytest.mark.parametrize("method", ("slice_np_vectorized", "slice", "nuts"))
+def test_warm_start(method, monkeypatch):
+    """Test that chains are only continued when `x` and `num_chains` are unchanged."""
+    posterior, target_distribution, potential_calls = _gaussian_mcmc_posterior(
+        method, warm_start=True
+    )
+    x_o = zeros(1, num_dim_gaussian)
+    posterior.sample((num_samples_gaussian,), x=x_o, show_progress_bars=False)
+    num_evals_cold = len(potential_calls)
+
+    num_inits = []
+    get_initial_params = posterior._get_initial_params
+
+    def counting_get_initial_params(*args, **kwargs):
+        num_inits.append(1)
+        return get_initial_params(*args, **kwargs)
+
+    monkeypatch.setattr(posterior, "_get_initial_params", counting_get_initial_params)
+
+    _sample_and_check_c2st(posterior, target_distribution, method)
+    assert not num_inits
+    # Continuing the chains must not be more expensive than starting them, e.g.,
+    # because a kernel that is only tuned during warmup is left untuned.
+    assert len(potential_calls) - num_evals_cold < 1.5 * num_evals_cold
+
+    # Changing `x` in-place must not continue the chains.
+    x_o.add_(100.0)
+    posterior.sample((10,), x=x_o, show_progress_bars=False)
+    assert len(num_inits) == 1
+
+    x_new = ones(1, num_dim_gaussian)
+    posterior.sample((10,), x=x_new, show_progress_bars=False)
+    posterior.sample((10,), x=x_new, num_chains=1, show_progress_bars=False)
+    assert len(num_inits) == 3
+
+
+def test_slice_np_chains_in_threads():
+    """Test `slice_np` with chains running in threads on a Gaussian."""
+    posterior, target_distribution, potential_calls = _gaussian_mcmc_posterior(
+        "slice_np", thin=2, num_chains=4, num_workers=2, use_threads=True
+    )
+    _sample_and_check_c2st(posterior, target_distribution, "slice_np")
+
+    # The chains evaluate single parameters, which are not recorded here if the
+    # chains run in processes. The initialization evaluates larger batches.
+    chain_threads = {
+        thread for shape, thread in potential_calls if shape == (1, num_dim_gaussian)
+    }
+    assert chain_threads
+    assert threading.main_thread().ident not in chain_threads
+
+
+def test_slice_np_posterior_with_shrink_batch_size():
+    """Test `slice_np` with batched shrinking, which bypasses the theta buffer."""
+    shrink_batch_size = 4
+    posterior, target_distribution, potential_calls = _gaussian_mcmc_posterior(
+        "slice_np", thin=2, shrink_batch_size=shrink_batch_size
+    )
+    _sample_and_check_c2st(posterior, target_distribution, "slice_np")
+
+    # Single parameters are copied into the buffer, batches of candidates are not.
+    batch_shapes = {shape for shape, _ in potential_calls}
+    assert (1, num_dim_gaussian) in batch_shapes
+    assert (shrink_batch_size, num_dim_gaussian) in batch_shapes
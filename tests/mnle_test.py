@@ -120,6 +120,28 @@ def test_mnle_api(sampler):
         )
 
 
+@pytest.mark.parametrize(
+    "build_kwargs",
+    (dict(eval_dtype=torch.bfloat16), dict(compile_log_prob=True)),
+)
+def test_mnle_rejects_unsupported_evaluation_options(build_kwargs):
+    """Test that MNLE does not silently ignore `eval_dtype` or `compile_log_prob`."""
+    num_simulations = 100
+    theta = torch.rand(num_simulations, 2)
+    x = torch.cat(
+        (
+            torch.rand(num_simulations, 1),
+            torch.randint(0, 2, (num_simulations, 1)),
+        ),
+        dim=1,
+    )
+    trainer = MNLE(prior=BoxUniform(torch.zeros(2), torch.ones(2)))
+    trainer.append_simulations(theta, x).train(max_num_epochs=1)
+
+    with pytest.raises(NotImplementedError, match=next(iter(build_kwargs))):
+        trainer.build_posterior(**build_kwargs)
+
+
 @pytest.mark.slow
 @pytest.mark.parametrize("sampler", ("mcmc", "rejection", "vi"))
 @pytest.mark.parametrize("num_trials", [5, 10])
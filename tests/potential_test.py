@@ -3,6 +3,9 @@
 
 from __future__ import annotations
 
+import pickle
+from copy import deepcopy
+
 import pytest
 import torch
 from torch import eye, ones, zeros
@@ -13,7 +16,9 @@ from sbi.inference import (
     MCMCPosterior,
     RejectionPosterior,
     VIPosterior,
+    likelihood_estimator_based_potential,
 )
+from sbi.utils import likelihood_nn
 
 
 @pytest.mark.parametrize(
@@ -59,3 +64,102 @@ def test_callable_potential(sampling_method):
     sample_std = torch.std(approx_samples, dim=0)
     assert torch.allclose(sample_mean, torch.as_tensor(mean) - x_o, atol=0.2)
     assert torch.allclose(sample_std, torch.sqrt(torch.as_tensor(cov)), atol=0.1)
+
+
+def test_likelihood_potential_with_mvn_prior():
+    """Test that the cached `MultivariateNormal` prior matches `prior.log_prob`."""
+    dim = 3
+    prior = MultivariateNormal(
+        ones(dim), torch.tensor([[2.0, 0.5, 0.0], [0.5, 1.0, 0.3], [0.0, 0.3, 0.5]])
+    )
+    theta = prior.sample((100,))
+    x = theta + torch.randn_like(theta)
+    likelihood_estimator = likelihood_nn("mdn", num_components=2)(theta, x)
+
+    potential_fn, _ = likelihood_estimator_based_potential(
+        likelihood_estimator, prior, x_o=x[:1]
+    )
+    log_likelihood = likelihood_estimator.log_prob(
+        x[:1].unsqueeze(0), condition=theta
+    ).squeeze(0)
+
+    assert potential_fn._prior_whitening is not None
+    assert torch.allclose(
+        potential_fn(theta, track_gradients=False),
+        log_likelihood.detach() + prior.log_prob(theta),
+        atol=1e-4,
+    )
+
+
+@pytest.mark.parametrize(
+    "loc, std", ((1.0, 1.0), (1e2, 1e-2), (1e3, 1e-3), (1e4, 1e-2))
+)
+def test_likelihood_potential_with_mvn_prior_far_from_origin(loc: float, std: float):
+    """Test that the cached prior stays accurate if its loc is large to its scale."""
+    dim = 3
+    prior = MultivariateNormal(loc * ones(dim), std**2 * eye(dim))
+    theta = prior.sample((1000,))
+    likelihood_estimator = likelihood_nn("mdn", num_components=2)(theta, theta)
+
+    potential_fn, _ = likelihood_estimator_based_potential(
+        likelihood_estimator, prior, x_o=theta[:1]
+    )
+
+    assert torch.allclose(
+        potential_fn._add_prior_log_prob(zeros(theta.shape[0]), theta),
+        prior.log_prob(theta),
+        atol=1e-4,
+    )
+
+
+def test_likelihood_potential_with_eval_dtype():
+    """Test that evaluating the likelihood estimator in bfloat16 stays close."""
+    dim = 2
+    prior = MultivariateNormal(zeros(dim), eye(dim))
+    theta = prior.sample((100,))
+    x = theta + 0.3 * torch.randn_like(theta)
+    likelihood_estimator = likelihood_nn("maf", num_transforms=2)(theta, x)
+
+    potential_fn, _ = likelihood_estimator_based_potential(
+        likelihood_estimator, prior, x_o=x[:1]
+    )
+    potential_fn_bf16, _ = likelihood_estimator_based_potential(
+        likelihood_estimator, prior, x_o=x[:1], eval_dtype=torch.bfloat16
+    )
+    potential = potential_fn(theta, track_gradients=False)
+    potential_bf16 = potential_fn_bf16(theta, track_gradients=False)
+
+    assert potential_bf16.dtype == torch.float32
+    assert next(likelihood_estimator.parameters()).dtype == torch.float32
+    assert torch.allclose(potential, potential_bf16, atol=0.2)
+
+
+@pytest.mark.skipif(not hasattr(torch, "compile"), reason="Requires torch.compile.")
+def test_likelihood_potential_with_compiled_log_prob():
+    """Test that the compiled potential matches the eager one and can be copied."""
+    dim = 2
+    prior = MultivariateNormal(zeros(dim), eye(dim))
+    theta = prior.sample((100,))
+    x = theta + 0.3 * torch.randn_like(theta)
+    likelihood_estimator = likelihood_nn("maf", num_transforms=2)(theta, x)
+
+    potential_fn, _ = likelihood_estimator_based_potential(
+        likelihood_estimator, prior, x_o=x[:1]
+    )
+    potential_fn_compiled, _ = likelihood_estimator_based_potential(
+        likelihood_estimator, prior, x_o=x[:1], compile_log_prob=True
+    )
+    potential = potential_fn(theta, track_gradients=False)
+    assert torch.allclose(
+        potential, potential_fn_compiled(theta, track_gradients=False), atol=1e-5
+    )
+
+    # The compiled function is dropped when copying and compiled again on first use.
+    for copied_potential_fn in (
+        deepcopy(potential_fn_compiled),
+        pickle.loads(pickle.dumps(potential_fn_compiled)),
+    ):
+        assert copied_potential_fn._compiled_log_prob is None
+        assert torch.allclose(
+            potential, copied_potential_fn(theta, track_gradients=False), atol=1e-5
+        )
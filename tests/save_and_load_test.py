@@ -40,3 +40,48 @@ def test_picklability(inference_method, sampling_method: str, tmp_path):
         pickle.dump(inference, handle)
     with open(f"{tmp_path}/saved_inference.pickle", "rb") as handle:
         _ = pickle.load(handle)
+
+
+def test_unpickling_posterior_of_older_version():
+    """Test that posteriors pickled without the newer attributes can still be used."""
+    num_dim = 2
+    prior = torch.distributions.MultivariateNormal(
+        torch.zeros(num_dim), torch.eye(num_dim)
+    )
+    x_o = torch.zeros(1, num_dim)
+
+    theta = prior.sample((500,))
+    x = theta + 1.0 + torch.randn_like(theta) * 0.1
+
+    inference = SNLE(prior=prior)
+    _ = inference.append_simulations(theta, x).train(max_num_epochs=1)
+    posterior = inference.build_posterior(
+        mcmc_method="slice_np", mcmc_parameters=dict(warmup_steps=5, thin=1)
+    ).set_default_x(x_o)
+
+    # Remove the attributes that did not exist in older versions of `sbi`.
+    for key_name in (
+        "step_size_adaptation",
+        "warm_start",
+        "adapt_width",
+        "shrink_batch_size",
+        "use_threads",
+        "_mcmc_init_x",
+        "_warned_log_prob",
+    ):
+        del posterior.__dict__[key_name]
+    for key_name in (
+        "_prior_whitening",
+        "eval_dtype",
+        "compile_log_prob",
+        "_x_o_trials",
+    ):
+        del posterior.potential_fn.__dict__[key_name]
+
+    with pytest.warns(UserWarning, match="older version"):
+        loaded_posterior = pickle.loads(pickle.dumps(posterior))
+
+    assert loaded_posterior.potential_fn._prior_whitening is None
+    samples = loaded_posterior.sample((10,), show_progress_bars=False)
+    assert samples.shape == (10, num_dim)
+    assert torch.isfinite(loaded_posterior.potential_fn(samples)).all()